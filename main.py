@@ -1,4 +1,6 @@
 import os
+import sys
+from datetime import datetime
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
@@ -128,6 +130,102 @@ def compute_airline_data(grouped_airlines, review_df, min_incidents):
 
     return results
 
+# the current version of the registration info file written by save_registration
+# version 1 files are the original dict of n-number -> (owner, injury, damage) tuples
+REGISTRATION_FILE_VERSION = 2
+
+# the injury and damage levels, an incident record stores the index of its level in these lists
+INJURY_LEVELS = ['None', 'Minor', 'Serious', 'Fatal']
+DAMAGE_LEVELS = ['None', 'Minor', 'Substantial', 'Destroyed']
+
+# a single incident, along with the airline that owned the aircraft at the time
+class IncidentRecord:
+    __slots__ = ('nnumber', 'airline', 'injury', 'damage', 'issue_date', 'cancel_date')
+
+    def __init__(self, nnumber, airline, injury, damage, issue_date, cancel_date):
+        self.nnumber = nnumber
+        self.airline = sys.intern(airline) # there are only a handful of airlines, share the strings
+        self.injury = injury
+        self.damage = damage
+        self.issue_date = issue_date
+        self.cancel_date = cancel_date
+
+    def injury_level(self):
+        return INJURY_LEVELS[self.injury]
+
+    def damage_level(self):
+        return DAMAGE_LEVELS[self.damage]
+
+    # the plain tuple that gets written to the registration file
+    def to_row(self):
+        return (self.nnumber, self.airline, self.injury, self.damage, self.issue_date, self.cancel_date)
+
+    def __repr__(self):
+        return (f"IncidentRecord({self.nnumber}, {self.airline}, {self.injury_level()}, {self.damage_level()}, "
+                f"{self.issue_date} - {self.cancel_date})")
+
+# creates an incident record from the owner found by get_owner_information and the incident levels
+def make_incident_record(nnumber, owner, injury, damage):
+    name, dates = owner
+    return IncidentRecord(nnumber, name, INJURY_LEVELS.index(injury), DAMAGE_LEVELS.index(damage),
+                          parse_registry_date(dates['ISSUE']), parse_registry_date(dates['CANCEL']))
+
+# the faa registry dates are of the form mm/dd/yyyy
+def parse_registry_date(date_str):
+    return datetime.strptime(date_str, '%m/%d/%Y').date()
+
+# reads the registration info file, converting older versions to incident records
+# returns a dictionary of n-numbers and their incident records, along with the version that was read
+def load_registration(file_path):
+    with open(file_path, "rb") as file:
+        data = pickle.load(file)
+
+    version = data.get('version', 1)
+    if version == 1:
+        # the original format, convert each record
+        airlines = {}
+        for nnumber in data:
+            # a record that can't be converted is skipped so we don't lose the rest of the file
+            try:
+                owner, injury, damage = data[nnumber]
+
+                # older files can hold NaN levels, these are filled the same way get_commercial_flights does
+                if pd.isna(injury):
+                    injury = 'None'
+                if pd.isna(damage):
+                    damage = 'None'
+
+                airlines[nnumber] = make_incident_record(nnumber, owner, injury, damage)
+            except (ValueError, TypeError) as e:
+                print(f"Skipping bad registration record {nnumber}: {e}")
+
+    elif version == REGISTRATION_FILE_VERSION:
+        airlines = {}
+        for row in data['records']:
+            airlines[row[0]] = IncidentRecord(*row)
+
+    else:
+        raise ValueError(f"Unknown registration file version: {version}")
+
+    return airlines, version
+
+# saves a dictionary of incident records as the current version of the registration info file
+# the data is written to a temp file first, so a failed write never clobbers the existing file
+def save_registration(file_path, airlines):
+    data = {
+        'version': REGISTRATION_FILE_VERSION,
+        'records': [airlines[nnumber].to_row() for nnumber in airlines]
+    }
+    tmp_path = file_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            pickle.dump(data, file)
+        os.replace(tmp_path, file_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 # takes user prompt to either load incident records from file(if exists) or fetch from the web
 def get_airline_incident_records():
     print("Checking for registration data . . .")
@@ -151,13 +249,20 @@ def get_airline_incident_records():
 
     # user requested to load the present file
     if not query:
-        with open(file_path, "rb") as file:
+        try:
+            airlines, version = load_registration(file_path)
+        except:
+            # just in case of a file error, we'll go ahead and refetch the data
+            print("Error reading the file, new data needs to be fetched")
+            query = True
+
+        # rewrite older files in the current format, the records are already loaded so a failure here is not fatal
+        if not query and version != REGISTRATION_FILE_VERSION:
             try:
-                airlines = pickle.load(file)
-            except:
-                # just in case of a file error, we'll go ahead and refetch the data
-                print("Error reading the file, new data needs to be fetched")
-                query = True
+                save_registration(file_path, airlines)
+                print(f"Upgraded registration file from version {version} to version {REGISTRATION_FILE_VERSION}")
+            except Exception as e:
+                print(f"Could not upgrade the registration file, keeping the version {version} file: {e}")
 
         # test print the loaded registration data
         """ if not query:
@@ -179,9 +284,8 @@ def get_airline_incident_records():
         print(f"Found {len(incidents)} commercial flights")
 
         print("Fetching registration info . . .")
-        with open(file_path, "wb") as file:
-            airlines = get_registration(incidents)
-            pickle.dump(airlines, file)
+        airlines = get_registration(incidents)
+        save_registration(file_path, airlines)
 
     return airlines
 
@@ -189,16 +293,16 @@ def get_airline_incident_records():
 def get_commercial_flights(df):
     incidents = []
 
+    # we need to replace the NaN values before pulling the records, they can't be converted to an incident level
+    df['Highest Injury Level'] = df['Highest Injury Level'].fillna('None')
+    df['Damage Level'] = df['Damage Level'].fillna('None')
+
     # pull only the part 121 flights from the dataframe
     for i in range(len(df)):
         if '121' in df.iloc[i, 17]:
             # append the n-number[0], highest injury level[1], damage level[2], and the event date[3]
             incidents.append([df.iloc[i, 13], df.iloc[i, 10], df.iloc[i, 12], df.iloc[i, 2]])
 
-    # we need to replace the NaN values, this poses a problem for airline scoring later
-    df['Highest Injury Level'] = df['Highest Injury Level'].fillna('None')
-    df['Damage Level'] = df['Damage Level'].fillna('None')
-
     return incidents
 
 # get registration information for a set of incident records
@@ -211,7 +315,7 @@ def get_registration(incidents):
         "user-agent" : "PostmanRuntime/7.37.3"
     }
 
-    # this is the dict that will hold the record of incident information
+    # this is the dict that will hold the incident records
     # n-numbers are the keys
     airlines = {}
 
@@ -236,8 +340,12 @@ def get_registration(incidents):
         owner = get_owner_information(soup, incident)
         if len(owner) != 0:
             # if an owner was found, add it to the dict along with injury and damage info
-            airlines[incident[0]] = (owner, incident[1], incident[2])
-            print(f"{i}: ({incident[0]} on {incident[3]}: {airlines[incident[0]]})\n")
+            # a record that can't be converted is skipped so we don't lose everything fetched so far
+            try:
+                airlines[incident[0]] = make_incident_record(incident[0], owner, incident[1], incident[2])
+                print(f"{i}: ({incident[0]} on {incident[3]}: {airlines[incident[0]]})\n")
+            except (ValueError, TypeError) as e:
+                print(f"{i}: ({incident[0]} on {incident[3]}: ###BAD RECORD: {e}###)\n")
             
         else:
             print(f"{i}: ({incident[0]} on {incident[3]}: ###NO OWNER FOUND###)\n")
@@ -409,7 +517,8 @@ def group_sort_airlines(airlines):
 
     # iterate over the dictionary of airlines
     for nnumber in airlines:
-        airline_name = airlines[nnumber][0][0]
+        incident_record = airlines[nnumber]
+        airline_name = incident_record.airline
 
         # first check to make sure we don't have one of the blacklisted names
         if airline_name in blacklist:
@@ -417,11 +526,11 @@ def group_sort_airlines(airlines):
 
         # if we have encountered a new airline name, create a new entry in the dict
         elif airline_name not in grouped_airlines.keys():
-            grouped_airlines[airline_name] = [(nnumber, airlines[nnumber])]
+            grouped_airlines[airline_name] = [incident_record]
 
         # if we encounter an airline name already in the dict, update the existing listing
         else:
-            grouped_airlines[airline_name].append((nnumber, airlines[nnumber]))
+            grouped_airlines[airline_name].append(incident_record)
     
     sorted_airlines = dict(sorted(grouped_airlines.items()))
 
@@ -472,8 +581,8 @@ def get_airline_incident_scores(grouped_airlines, min_records):
             sum = 0
             for incident_record in grouped_airlines[airline_name]:
                 # get the injury and damage level
-                injury = incident_record[1][1]
-                damage = incident_record[1][2]
+                injury = incident_record.injury_level()
+                damage = incident_record.damage_level()
 
                 # increment the counters for these levels
                 injury_counter = airline_scores[airline_name]['injury'][injury]
@@ -540,33 +649,79 @@ def get_airline_review_scores(airline_reviews):
     # BERT do be slow tho...
     sentiment_pipeline = pipeline('sentiment-analysis', model='distilbert-base-uncased-finetuned-sst-2-english')    
 
+    # the dataset has plenty of duplicate reviews, and a review can be matched to more than one airline,
+    # so we collapse each airline's reviews down to the unique texts and how many times each one appears
+    airline_review_counts = dedup_reviews(airline_reviews)
+
+    # every unique review text and chunk is only scored once, these hold the scores across all airlines
+    vader_cache = {}
+    bert_cache = {}
+
+    # keep track of how much work the dedup saved us
+    total_reviews = 0
+    total_chunks = 0
+
     # iterate through each airline
-    for airline in airline_reviews:
+    for airline in airline_review_counts:
         print(f"Analyzing {len(airline_reviews[airline])} reviews for {airline}!")
         review_scores[airline] = {}
 
         vader_sum = 0
         bert_sum = 0
         
-        # then iterate over every review for that airline
-        review_list = airline_reviews[airline]
-        for review in review_list:
-            vader_sentiment = sia.polarity_scores(review[0])
-            vader_sum += convert_vader_scale(vader_sentiment['compound'])
+        # then iterate over every unique review for that airline
+        review_counts = airline_review_counts[airline]
+        for text in review_counts:
+            count = review_counts[text]
+
+            if text not in vader_cache:
+                vader_sentiment = sia.polarity_scores(text)
+                vader_cache[text] = convert_vader_scale(vader_sentiment['compound'])
+            vader_sum += vader_cache[text] * count
 
             # before using BERT, we have to chunk the review text
-            chunks = split_into_chunks(review[0], chunk_size=300)
+            chunks = split_into_chunks(text, chunk_size=300)
 
             # then analyze each chunk and average the sentiment scores
             for chunk in chunks:
-                bert_sum += convert_bert_scale(sentiment_pipeline(chunk)[0])
+                if chunk not in bert_cache:
+                    bert_cache[chunk] = convert_bert_scale(sentiment_pipeline(chunk)[0])
+                bert_sum += bert_cache[chunk] * count
+
+            total_reviews += count
+            total_chunks += len(chunks) * count
 
         # calculate the average for the airline
-        review_scores[airline]['vader'] = vader_sum / len(review_list)
-        review_scores[airline]['bert'] = bert_sum / len(review_list)
+        review_scores[airline]['vader'] = vader_sum / len(airline_reviews[airline])
+        review_scores[airline]['bert'] = bert_sum / len(airline_reviews[airline])
+
+    # report how much duplicate work was skipped
+    print(f"VADER: scored {len(vader_cache)} unique reviews out of {total_reviews}, "
+          f"skipped {total_reviews - len(vader_cache)} duplicates")
+    print(f"BERT: scored {len(bert_cache)} unique chunks out of {total_chunks}, "
+          f"skipped {total_chunks - len(bert_cache)} duplicates")
 
     return review_scores
 
+# groups the reviews for each airline by their normalized text
+# returns a dictionary of airlines, each holding a dictionary of unique review text to its number of occurrences
+def dedup_reviews(airline_reviews):
+    airline_review_counts = {}
+
+    for airline in airline_reviews:
+        review_counts = {}
+        for review in airline_reviews[airline]:
+            text = normalize_review_text(review[0])
+            review_counts[text] = review_counts.get(text, 0) + 1
+        airline_review_counts[airline] = review_counts
+
+    return airline_review_counts
+
+# collapses all of the whitespace in a review text down to single spaces
+# both VADER and the chunking split on whitespace, so this does not change the scores
+def normalize_review_text(text):
+    return " ".join(text.split())
+
 # converts the VADER compound score(-1 to 1) to a scale from 1 to 10
 def convert_vader_scale(score):
     return round((score + 1) * 4.5 + 1)
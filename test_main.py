@@ -0,0 +1,48 @@
+import pickle
+from datetime import date
+
+import main
+
+# upgrading a version 1 registration file should convert every good record, including NaN levels,
+# skip records that can't be converted, and leave a version 2 file that loads the same records
+def test_upgrade_version_1_registration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    version_1 = {
+        'N790AN': (['AMERICAN AIRLINES INC', {'ISSUE': '06/23/2000', 'CANCEL': '07/31/2027'}], 'Minor', 'Substantial'),
+        'N233YV': (['MESA AIRLINES INC', {'ISSUE': '11/20/1996', 'CANCEL': '01/16/2018'}], float('nan'), float('nan')),
+        'N712FE': (['FEDERAL EXPRESS CORP', {'ISSUE': 'NOT FOUND', 'CANCEL': '03/14/2005'}], 'None', 'Substantial'),
+    }
+    with open("registration_info.pkl", "wb") as file:
+        pickle.dump(version_1, file)
+
+    airlines = main.get_airline_incident_records()
+
+    # the record with a missing date is skipped
+    assert sorted(airlines.keys()) == ['N233YV', 'N790AN']
+
+    record = airlines['N790AN']
+    assert record.airline == 'AMERICAN AIRLINES INC'
+    assert record.injury_level() == 'Minor'
+    assert record.damage_level() == 'Substantial'
+    assert record.issue_date == date(2000, 6, 23)
+    assert record.cancel_date == date(2027, 7, 31)
+
+    # NaN levels are treated as 'None'
+    record = airlines['N233YV']
+    assert record.injury_level() == 'None'
+    assert record.damage_level() == 'None'
+    assert record.issue_date == date(1996, 11, 20)
+    assert record.cancel_date == date(2018, 1, 16)
+
+    # the file was rewritten as version 2
+    with open("registration_info.pkl", "rb") as file:
+        data = pickle.load(file)
+    assert data['version'] == main.REGISTRATION_FILE_VERSION
+    assert len(data['records']) == 2
+
+    # and reloading it gives back the same records
+    reloaded = main.get_airline_incident_records()
+    assert sorted(reloaded.keys()) == sorted(airlines.keys())
+    for nnumber in airlines:
+        assert reloaded[nnumber].to_row() == airlines[nnumber].to_row()